@@ -1,14 +1,25 @@
 """Contains code for evaluating the resulting partition.
 """
 
-from typing import Callable, Dict, List, Tuple
+import math
+from typing import Dict, Tuple
 
 from graph_tool import Graph
 from graph_tool.inference import BlockState
 from graph_tool.inference.modularity import modularity
-from munkres import Munkres  # for correctness evaluation
 import numpy as np
-import scipy.special as misc
+from scipy.optimize import linear_sum_assignment  # for correctness evaluation
+from scipy.sparse import coo_matrix, issparse
+
+try:
+    from numba import get_num_threads, njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:  # numba is optional, the numpy implementations are used when it is not installed
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        return lambda function: function
+    prange = range
 
 from evaluation import Evaluation
 
@@ -39,14 +50,17 @@ def evaluate_partition(graph: Graph, true_b: np.ndarray, alg_partition: BlockSta
     evaluation.max_full_graph_description_length = BlockState(
         graph, graph.new_vertex_property("int", np.arange(graph.num_vertices()))).entropy()
     evaluation.full_graph_modularity = modularity(graph, alg_partition.get_blocks())
-    if np.unique(true_b).size != 1:
+    if np.any(true_b != true_b[0]):  # Cannot evaluate the below metrics if true partition isn't provided
         contingency_table, N = create_contingency_table(true_b, alg_b, evaluation)
+        # only the accuracy depends on matching the blocks, the other metrics are invariant to their order
+        if not evaluation.args.skip_accuracy:
+            contingency_table = evaluate_accuracy(contingency_table, evaluation)
         evaluation.contingency_table = contingency_table
-        joint_prob = evaluate_accuracy(contingency_table, evaluation)
-        evaluate_pairwise_metrics(contingency_table, N, evaluation)
-        evaluate_entropy_metrics(joint_prob, evaluation)
+        rowsum, colsum = marginal_sums(contingency_table)
+        evaluate_pairwise_metrics(contingency_table, N, rowsum, colsum, evaluation)
+        evaluate_entropy_metrics(contingency_table / N, rowsum / N, colsum / N, evaluation)
     else:
-        evaluation.num_blocks_algorithm = max(alg_b) + 1
+        evaluation.num_blocks_algorithm = alg_b.max() + 1
     evaluation.save()
 # End of evaluate_partition()
 
@@ -75,15 +89,17 @@ def evaluate_sampled_graph_partition(graph: Graph, true_b: np.ndarray, alg_parti
     evaluation.max_sampled_graph_description_length = BlockState(
         graph, graph.new_vertex_property("int", np.arange(graph.num_vertices()))).entropy()
     evaluation.sampled_graph_modularity = modularity(graph, alg_partition.get_blocks())
-    if np.unique(true_b).size == 1:  # Cannot evaluate the below metrics if true partition isn't provided
-        evaluation.sampled_graph_num_blocks_algorithm = max(alg_b) + 1
+    if np.all(true_b == true_b[0]):  # Cannot evaluate the below metrics if true partition isn't provided
+        evaluation.sampled_graph_num_blocks_algorithm = alg_b.max() + 1
         return
     true_b = np.asarray([block_mapping[block] for block in true_b])
     contingency_table, N = create_contingency_table(true_b, alg_b, evaluation, sampled_graph=True)
+    if not evaluation.args.skip_accuracy:
+        contingency_table = evaluate_accuracy(contingency_table, evaluation, True)
     evaluation.sampled_graph_contingency_table = contingency_table
-    joint_prob = evaluate_accuracy(contingency_table, evaluation, True)
-    evaluate_pairwise_metrics(contingency_table, N, evaluation, True)
-    evaluate_entropy_metrics(joint_prob, evaluation, True)
+    rowsum, colsum = marginal_sums(contingency_table)
+    evaluate_pairwise_metrics(contingency_table, N, rowsum, colsum, evaluation, True)
+    evaluate_entropy_metrics(contingency_table / N, rowsum / N, colsum / N, evaluation, True)
 # End of evaluate_sampled_graph_partition()
 
 
@@ -106,19 +122,23 @@ def create_contingency_table(true_b: np.ndarray, alg_b: np.ndarray, evaluation:
 
     Returns
     -------
-    contingency_table : np.ndarray (int)
+    contingency_table : np.ndarray or scipy.sparse.csr_matrix (int)
         the contingency table (confusion matrix) comparing the true block assignment to the algorithmically determined
-        community assignment
+        community assignment. The rows and columns are in block order, and have not been matched to each other. The
+        table is sparse if the accuracy is skipped and the table would have more than 4 cells per vertex
     N : int
         the number of vertices in the graph
     """
-    blocks_b1 = true_b
-    blocks_b1_set = set(true_b)
-    blocks_b1_set.discard(-1)  # -1 is the label for 'unknown'
-    num_blocks_truth = len(blocks_b1_set)
-
-    blocks_b2 = alg_b
-    num_blocks_alg = max(blocks_b2) + 1
+    valid = true_b != -1  # -1 is the label for 'unknown'
+    valid_true_b = true_b[valid]
+    # counting the occurrences of each label is a single O(N) pass, whereas np.unique sorts the labels
+    truth_block_sizes = np.bincount(valid_true_b)
+    num_blocks_truth = np.count_nonzero(truth_block_sizes)
+    # the table has one row per truth block, so the truth labels must be contiguous from 0
+    if truth_block_sizes.size != num_blocks_truth:
+        raise ValueError("truth partition has empty blocks: {} distinct labels in [0,{}]".format(
+            num_blocks_truth, truth_block_sizes.size - 1))
+    num_blocks_alg = int(alg_b.max()) + 1
 
     if sampled_graph:
         evaluation.sampled_graph_num_blocks_algorithm = num_blocks_alg
@@ -127,104 +147,222 @@ def create_contingency_table(true_b: np.ndarray, alg_b: np.ndarray, evaluation:
         evaluation.num_blocks_algorithm = num_blocks_alg
         evaluation.num_blocks_truth = num_blocks_truth
 
-    print('\nPartition Correctness Evaluation\n')
-    print('Number of nodes: {}'.format(len(alg_b)))
-    print('Number of communities in truth partition: {}'.format(num_blocks_truth))
-    print('Number of communities in alg. partition: {}'.format(num_blocks_alg))
-
-    # populate the confusion matrix between the two partitions
-    contingency_table = np.zeros((num_blocks_truth, num_blocks_alg))
-    for i in range(len(alg_b)):  # evaluation based on nodes observed so far
-        if true_b[i] != -1:  # do not include nodes without truth in the evaluation
-            contingency_table[blocks_b1[i], blocks_b2[i]] += 1
+    if evaluation.verbose:
+        print('\nPartition Correctness Evaluation\n')
+        print('Number of nodes: {}'.format(len(alg_b)))
+        print('Number of communities in truth partition: {}'.format(num_blocks_truth))
+        print('Number of communities in alg. partition: {}'.format(num_blocks_alg))
+
+    # populate the confusion matrix between the two partitions. Nodes without truth are not included in the
+    # evaluation
+    if evaluation.args.skip_accuracy and num_blocks_truth * num_blocks_alg > 4 * valid_true_b.size:
+        # most of the cells would be empty, so only store the non-zero ones. Converting to CSR sums the duplicates.
+        # Matching the blocks for the accuracy needs the dense table, so the table is only sparse if that is skipped
+        contingency_table = coo_matrix((np.ones(valid_true_b.size, dtype=np.int64), (valid_true_b, alg_b[valid])),
+                                       shape=(num_blocks_truth, num_blocks_alg)).tocsr()
+    elif NUMBA_AVAILABLE:
+        # only use as many threads as can each fill a private table of their own
+        num_threads = max(1, min(get_num_threads(), len(alg_b) // (num_blocks_truth * num_blocks_alg)))
+        contingency_table = _build_contingency_table(true_b, alg_b, num_blocks_truth, num_blocks_alg, num_threads)
+    else:  # flatten each (truth, alg) pair into a linear index so the table can be built with one bincount
+        flat = valid_true_b.astype(np.intp) * num_blocks_alg + alg_b[valid].astype(np.intp)
+        contingency_table = np.bincount(flat, minlength=num_blocks_truth * num_blocks_alg).reshape(
+            num_blocks_truth, num_blocks_alg).astype(np.int64, copy=False)
     N = contingency_table.sum()
+    return contingency_table, N
+# End of create_contingency_table()
+
 
+@njit(parallel=True, cache=True)
+def _build_contingency_table(true_b: np.ndarray, alg_b: np.ndarray, num_blocks_truth: int, num_blocks_alg: int,
+                             num_threads: int) -> np.ndarray:
+    """Counts the (truth, alg) block pairs in a single pass over the vertices. Each thread fills a private table for
+    a contiguous chunk of the vertices, and the private tables are summed at the end, so that no two threads ever
+    increment the same cell.
+
+    Parameters
+    ----------
+    true_b : ndarray (int)
+        array of truth block assignment for each node, with -1 for nodes whose truth block is unknown
+    alg_b : ndarray (int)
+        array of output block assignment for each node
+    num_blocks_truth : int
+        the number of blocks in the truth partition
+    num_blocks_alg : int
+        the number of blocks in the algorithmic partition
+    num_threads : int
+        the number of private tables to accumulate in parallel
+
+    Returns
+    -------
+    contingency_table : np.ndarray (int)
+        the contingency table, before any label association
+    """
+    num_vertices = alg_b.shape[0]
+    chunk_size = (num_vertices + num_threads - 1) // num_threads
+    partial_tables = np.zeros((num_threads, num_blocks_truth, num_blocks_alg), dtype=np.int64)
+    for thread in prange(num_threads):
+        for i in range(thread * chunk_size, min((thread + 1) * chunk_size, num_vertices)):
+            if true_b[i] != -1:
+                partial_tables[thread, true_b[i], alg_b[i]] += 1
+    contingency_table = np.zeros((num_blocks_truth, num_blocks_alg), dtype=np.int64)
+    for row in prange(num_blocks_truth):
+        for thread in range(num_threads):
+            for col in range(num_blocks_alg):
+                contingency_table[row, col] += partial_tables[thread, row, col]
+    return contingency_table
+# End of _build_contingency_table()
+
+
+def match_contingency_table(contingency_table: np.ndarray) -> np.ndarray:
+    """Reorders the contingency table so that each truth block is paired up with the algorithmic block it overlaps
+    with the most, as determined by linear assignment. The paired blocks are placed along the diagonal.
+
+    Parameters
+    ---------
+    contingency_table : np.ndarray (int)
+        the un-matched contingency table
+
+    Returns
+    ------
+    contingency_table : np.ndarray (int)
+        the contingency table, after the rows and columns have been properly matched using linear assignment
+    """
     # transpose matrix for linear assignment (this implementation assumes #col >= #row)
-    if num_blocks_truth > num_blocks_alg:
+    transpose = contingency_table.shape[0] > contingency_table.shape[1]
+    if transpose:
         contingency_table = contingency_table.transpose()
-    contingency_table_before_assignment = np.array(contingency_table)
 
     # associate the labels between two partitions using linear assignment
-    contingency_table, indexes = associate_labels(contingency_table, contingency_table_before_assignment)
+    associated_columns = associate_labels(contingency_table)
 
-    # fill in the un-associated columns
-    contingency_table = fill_unassociated_columns(contingency_table, contingency_table_before_assignment, indexes)
+    # fill in the un-associated columns, then reorder all the columns with a single gather
+    column_order = fill_unassociated_columns(associated_columns, contingency_table.shape[1])
+    contingency_table = contingency_table[:, column_order]
 
-    if num_blocks_truth > num_blocks_alg:  # transpose back
+    if transpose:  # transpose back
         contingency_table = contingency_table.transpose()
-    print('Contingency Table: \n{}'.format(contingency_table))
-    return contingency_table, N
-# End of create_contingency_table()
+    return contingency_table
+# End of match_contingency_table()
 
 
-def associate_labels(contingency_table: np.ndarray,
-                     contingency_table_before_assignment: np.ndarray) -> Tuple[np.ndarray, List[Tuple[int, int]]]:
-    """Uses linear assignment through Munkres to correctly pair up the block numbers in the truth and algorithmic
+def associate_labels(contingency_table: np.ndarray) -> np.ndarray:
+    """Uses linear assignment to correctly pair up the block numbers in the truth and algorithmic
     partitions.
 
     Parameters
     ---------
     contingency_table : np.ndarray (int)
-            the un-matched contingency table, will be modified in this function
-    contingency_table_before_assignment : np.ndarray (int)
-            the un-matched contingency table, will not be modified in this function
+            the un-matched contingency table, with at least as many columns as rows
 
     Returns
     ------
-    contingency_table : np.ndarray (int)
-            the contingency table, after the rows and columns have been properly matched using Munkres
-    indexes : List[Tuple[int,int]]
-            the indexes for traversing the matrix, as determined by Munkres
+    associated_columns : np.ndarray (int)
+            the column associated with each row of the contingency table, as determined by linear assignment
     """
-    # associate the labels between two partitions using linear assignment
-    assignment = Munkres()  # use the Hungarian algorithm / Kuhn-Munkres algorithm
-    indexes = assignment.compute(-contingency_table)
-    total = 0
-    for row, column in indexes:
-        contingency_table[:, row] = contingency_table_before_assignment[:, column]
-        total += contingency_table[row, row]
-    return contingency_table, indexes
+    # associate the labels between two partitions using linear assignment (Jonker-Volgenant algorithm). Since there
+    # are no more rows than columns, every row is assigned, and the row indexes are returned in sorted order
+    _, associated_columns = linear_sum_assignment(-contingency_table)
+    return associated_columns
 # End of associate_labels()
 
 
-def fill_unassociated_columns(contingency_table: np.ndarray, contingency_table_before_assignment: np.ndarray,
-                              indexes: List[Tuple[int, int]]) -> np.ndarray:
-    """Uses linear assignment through Munkres to correctly pair up the block numbers in the truth and algorithmic
-    partitions.
+def fill_unassociated_columns(associated_columns: np.ndarray, num_columns: int) -> np.ndarray:
+    """Appends the columns that were not associated with any row to the associated columns, so that the result is
+    a permutation of all the columns in the contingency table.
 
     Parameters
     ---------
-    contingency_table : np.ndarray (int)
-        the current contingency table, will be modified in this function
-    contingency_table_before_assignment : np.ndarray (int)
-        the un-matched contingency table, will not be modified in this function
-    indexes : List[Tuple[int,int]]
-        the list of indexes for traversing the matrix, as determined by Munkres
+    associated_columns : np.ndarray (int)
+        the column associated with each row of the contingency table, as determined by linear assignment
+    num_columns : int
+        the number of columns in the contingency table
 
     Returns
     ------
-    contingency_table : np.ndarray (int)
-        the contingency table, after the rows and columns have been properly matched using Munkres
+    column_order : np.ndarray (int)
+        the original index of each column in the matched contingency table
     """
-    # fill in the un-associated columns
-    unassociated_col = set(range(contingency_table.shape[1])) - set(np.array(indexes)[:, 1])
-    counter = 0
-    for column in unassociated_col:
-        contingency_table[:, contingency_table.shape[0] + counter] = contingency_table_before_assignment[:, column]
-        counter += 1
-    return contingency_table
+    unassociated_columns = np.setdiff1d(np.arange(num_columns), associated_columns)
+    return np.concatenate((associated_columns, unassociated_columns))
 # End of fill_unassociated_columns()
 
 
-def evaluate_accuracy(contingency_table: np.ndarray, evaluation: Evaluation,
-                      is_sampled_graph: bool = False) -> np.ndarray:
-    """Evaluates the accuracy of partitioning.
+def marginal_sums(contingency_table: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Computes the row and column sums of the contingency table, which are shared by the pairwise and entropy
+    metrics.
+
+    Parameters
+    ---------
+    contingency_table : np.ndarray or scipy.sparse.csr_matrix (int)
+        the contingency table (confusion matrix) comparing the true block assignment to the algorithmically
+        determined block assignment
+
+    Returns
+    ------
+    rowsum : np.ndarray (int)
+        the sum of values across the rows of the contingency table (the size of each truth block)
+    colsum : np.ndarray (int)
+        the sum of values across the columns of the contingency table (the size of each algorithm block)
+    """
+    if issparse(contingency_table):
+        return np.asarray(contingency_table.sum(axis=1)).ravel(), np.asarray(contingency_table.sum(axis=0)).ravel()
+    if NUMBA_AVAILABLE:
+        # gathering the matched columns leaves the table F-ordered when it was not transposed for matching (at most
+        # as many truth blocks as algorithm blocks), so walk its transpose to read it in memory order
+        if contingency_table.flags.f_contiguous and not contingency_table.flags.c_contiguous:
+            colsum, rowsum = _marginal_sums(contingency_table.T)
+        else:
+            rowsum, colsum = _marginal_sums(contingency_table)
+        return rowsum, colsum
+    rowsum = np.add.reduce(contingency_table, axis=1)
+    colsum = np.add.reduce(contingency_table, axis=0)
+    return rowsum, colsum
+# End of marginal_sums()
+
+
+@njit(cache=True)
+def _marginal_sums(contingency_table: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Computes the row and column sums of a dense contingency table in a single pass over its rows, instead of
+    reading the whole table once per axis.
 
     Parameters
     ---------
     contingency_table : np.ndarray (int)
         the contingency table (confusion matrix) comparing the true block assignment to the algorithmically
         determined block assignment
+
+    Returns
+    ------
+    rowsum : np.ndarray (int)
+        the sum of values across the rows of the contingency table
+    colsum : np.ndarray (int)
+        the sum of values across the columns of the contingency table
+    """
+    num_rows, num_cols = contingency_table.shape
+    rowsum = np.zeros(num_rows, dtype=contingency_table.dtype)
+    colsum = np.zeros(num_cols, dtype=contingency_table.dtype)
+    for row in range(num_rows):
+        total = 0
+        for col in range(num_cols):
+            value = contingency_table[row, col]
+            total += value
+            colsum[col] += value
+        rowsum[row] = total
+    return rowsum, colsum
+# End of _marginal_sums()
+
+
+def evaluate_accuracy(contingency_table: np.ndarray, evaluation: Evaluation,
+                      is_sampled_graph: bool = False) -> np.ndarray:
+    """Evaluates the accuracy of partitioning, after optimally matching the truth and algorithmic blocks. This is
+    the only metric that requires the blocks to be matched.
+
+    Parameters
+    ---------
+    contingency_table : np.ndarray (int)
+        the un-matched contingency table (confusion matrix) comparing the true block assignment to the
+        algorithmically determined block assignment
     evaluation : Evaluation
         stores evaluation results
     is_sampled_graph : bool
@@ -232,57 +370,64 @@ def evaluate_accuracy(contingency_table: np.ndarray, evaluation: Evaluation,
 
     Returns
     -------
-    joint_prob : np.ndarray (float)
-        the normalized contingency table
+    contingency_table : np.ndarray (int)
+        the contingency table, after the rows and columns have been properly matched using linear assignment
     """
-    # joint probability of the two partitions is just the normalized contingency table
-    joint_prob = contingency_table / sum(sum(contingency_table))
-    accuracy = sum(joint_prob.diagonal())
-    print('Accuracy (with optimal partition matching): {}'.format(accuracy))
-    print()
+    contingency_table = match_contingency_table(contingency_table)
+    # the accuracy is the fraction of nodes that lie on the diagonal of the matched contingency table
+    accuracy = contingency_table.trace() / contingency_table.sum()
+    if evaluation.verbose:
+        # formatting the whole table is slow when there are many blocks, so large tables are summarized
+        print('Contingency Table: \n{}'.format(np.array2string(contingency_table, threshold=100)))
+        print('Accuracy (with optimal partition matching): {}'.format(accuracy))
+        print()
     if is_sampled_graph:
         evaluation.sampled_graph_accuracy = accuracy
     else:
         evaluation.accuracy = accuracy
-    return joint_prob
+    return contingency_table
 # End of evaluate_accuracy()
 
 
-def evaluate_pairwise_metrics(contingency_table: np.ndarray, N: int, evaluation: Evaluation,
-                              is_sampled_graph: bool = False):
+def evaluate_pairwise_metrics(contingency_table: np.ndarray, N: int, rowsum: np.ndarray, colsum: np.ndarray,
+                              evaluation: Evaluation, is_sampled_graph: bool = False):
     """Evaluates the pairwise metrics for goodness of the partitioning. Metrics evaluated:
     rand index, adjusted rand index, pairwise recall, pairwise precision.
 
     Parameters
     ---------
-    contingency_table : np.ndarray (int)
+    contingency_table : np.ndarray or scipy.sparse.csr_matrix (int)
         the contingency table (confusion matrix) comparing the true block assignment to the algorithmically
         determined block assignment
     N : int
         the number of nodes in the confusion matrix
+    rowsum : np.ndarray (int)
+        the sum of values across the rows of the contingency table
+    colsum : np.ndarray (int)
+        the sum of values across the columns of the contingency table
     evaluation : Evaluation
         stores evaluation results
     is_sampled_graph : bool
         True if evaluation is for a sampled graph. Default = False
     """
-    # Compute pair-counting-based metrics
-    def nchoose2(a):
-        return misc.comb(a, 2)
-
-    num_pairs = nchoose2(N)
-    colsum = np.sum(contingency_table, axis=0)
-    rowsum = np.sum(contingency_table, axis=1)
+    # Compute pair-counting-based metrics. Every pair count below is derived from the sums of squares of the table,
+    # the row sums and the column sums, since sum(x choose 2) = (sum(x^2) - sum(x)) / 2
+    num_pairs = _choose2(N)
+    if issparse(contingency_table):  # only the non-zero cells contribute to the sum of squares
+        sum_table_squared = np.dot(contingency_table.data, contingency_table.data)
+    else:
+        sum_table_squared = np.einsum('ij,ij->', contingency_table, contingency_table)
+    sum_rowsum_squared = np.dot(rowsum, rowsum)
+    sum_colsum_squared = np.dot(colsum, colsum)
     # compute counts of agreements and disagreement (4 types) and the regular rand index
-    count_in_each_b1 = np.sum(contingency_table, axis=1)
-    count_in_each_b2 = np.sum(contingency_table, axis=0)
-    num_same_in_b1 = sum(count_in_each_b1 * (count_in_each_b1 - 1)) / 2
-    num_same_in_b2 = sum(count_in_each_b2 * (count_in_each_b2 - 1)) / 2
-    num_agreement_same = 0.5 * sum(sum(contingency_table * (contingency_table - 1)))
-    num_agreement_diff = calc_num_agreement_diff(contingency_table, N, colsum, rowsum)
+    num_same_in_b1 = 0.5 * (sum_rowsum_squared - N)
+    num_same_in_b2 = 0.5 * (sum_colsum_squared - N)
+    num_agreement_same = 0.5 * (sum_table_squared - N)
+    num_agreement_diff = calc_num_agreement_diff(N, sum_table_squared, sum_rowsum_squared, sum_colsum_squared)
     num_agreement = num_agreement_same + num_agreement_diff
     rand_index = num_agreement / num_pairs
 
-    adjusted_rand_index = calc_adjusted_rand_index(contingency_table, nchoose2, colsum, rowsum, num_pairs)
+    adjusted_rand_index = calc_adjusted_rand_index(num_agreement_same, num_same_in_b1, num_same_in_b2, num_pairs)
 
     if is_sampled_graph:
         evaluation.sampled_graph_rand_index = rand_index
@@ -295,95 +440,108 @@ def evaluate_pairwise_metrics(contingency_table: np.ndarray, N: int, evaluation:
         evaluation.pairwise_recall = num_agreement_same / num_same_in_b1
         evaluation.pairwise_precision = num_agreement_same / num_same_in_b2
 
-    print('Rand Index: {}'.format(rand_index))
-    print('Adjusted Rand Index: {}'.format(adjusted_rand_index))
-    print('Pairwise Recall: {}'.format(num_agreement_same / (num_same_in_b1)))
-    print('Pairwise Precision: {}'.format(num_agreement_same / (num_same_in_b2)))
-    print('\n')
+    if evaluation.verbose:
+        print('Rand Index: {}'.format(rand_index))
+        print('Adjusted Rand Index: {}'.format(adjusted_rand_index))
+        print('Pairwise Recall: {}'.format(num_agreement_same / (num_same_in_b1)))
+        print('Pairwise Precision: {}'.format(num_agreement_same / (num_same_in_b2)))
+        print('\n')
 # End of evaluate_pairwise_metrics()
 
 
-def calc_num_agreement_diff(contingency_table: np.ndarray, N: int, colsum: np.ndarray, rowsum: np.ndarray) -> float:
+def calc_num_agreement_diff(N: int, sum_table_squared: int, sum_rowsum_squared: int, sum_colsum_squared: int) -> float:
     """Calculates the number of nodes that are different blocks in both the true and algorithmic block assignment.
 
         Parameters
         ---------
-        contingency_table : np.ndarray (int)
-                the contingency table (confusion matrix) comparing the true block assignment to the algorithmically
-                determined block assignment
         N : int
                 the number of nodes in the confusion matrix
-        colsum : np.ndarray (int)
-                the sum of values across the columns of the contingency table
-        rowsum : np.ndarray (int)
-                the sum of values across the rows of the contingency table
+        sum_table_squared : int
+                the sum of the squared values in the contingency table
+        sum_rowsum_squared : int
+                the sum of the squared row sums of the contingency table
+        sum_colsum_squared : int
+                the sum of the squared column sums of the contingency table
 
         Returns
         ------
         num_agreement_diff : float
                 the number of nodes that are in different blocks in both the true and algorithmic block assignment
     """
-    sum_table_squared = sum(sum(contingency_table ** 2))
-    sum_colsum_squared = sum(colsum ** 2)
-    sum_rowsum_squared = sum(rowsum ** 2)
     num_agreement_diff = 0.5 * (N ** 2 + sum_table_squared - sum_colsum_squared - sum_rowsum_squared)
     return num_agreement_diff
 # End of calc_num_agreement_diff()
 
 
-def calc_adjusted_rand_index(contingency_table: np.ndarray, nchoose2: Callable, colsum: np.ndarray,
-                             rowsum: np.ndarray, num_pairs: int) -> float:
+def calc_adjusted_rand_index(sum_table_choose_2: float, sum_rowsum_choose_2: float, sum_colsum_choose_2: float,
+                             num_pairs: int) -> float:
     """Calculates the adjusted rand index for the given contingency table.
 
     Parameters
     ---------
-    contingency_table : np.ndarray (int)
-        the contingency table (confusion matrix) comparing the true block assignment to the algorithmically
-        determined block assignment
-    nchoose2 : Callable
-        the n choose 2 function
-    colsum : np.ndarray (int)
-        the sum of values across the columns of the contingency table
-    rowsum : np.ndarray (int)
-        the sum of values across the rows of the contingency table
+    sum_table_choose_2 : float
+        the sum of (x choose 2) over the values x in the contingency table
+    sum_rowsum_choose_2 : float
+        the sum of (x choose 2) over the row sums x of the contingency table
+    sum_colsum_choose_2 : float
+        the sum of (x choose 2) over the column sums x of the contingency table
     num_pairs : int
-        the number of pairs (result of nchoose2(num_nodes_in_contingency_table))
+        the number of pairs (result of _choose2(num_nodes_in_contingency_table))
 
     Returns
     ------
     adjusted_rand_index : float
         the adjusted rand index calculated here
     """
-    vectorized_nchoose2 = np.vectorize(nchoose2)
-    sum_table_choose_2 = sum(sum(vectorized_nchoose2(contingency_table)))
-    sum_colsum_choose_2 = sum(vectorized_nchoose2(colsum))
-    sum_rowsum_choose_2 = sum(vectorized_nchoose2(rowsum))
     adjusted_rand_index = (sum_table_choose_2 - sum_rowsum_choose_2 * sum_colsum_choose_2 / num_pairs) / (
         0.5 * (sum_rowsum_choose_2 + sum_colsum_choose_2) - sum_rowsum_choose_2 * sum_colsum_choose_2 / num_pairs)
     return adjusted_rand_index
 # End of calc_adjusted_rand_index()
 
 
-def evaluate_entropy_metrics(joint_prob: np.ndarray, evaluation: Evaluation, is_sampled_graph: bool = False):
+def _choose2(a):
+    """Computes n choose 2 in closed form.
+
+    Parameters
+    ---------
+    a : int or np.ndarray (int)
+        the value(s) of n
+
+    Returns
+    ------
+    a_choose_2 : float or np.ndarray (float)
+        n choose 2, computed element-wise if a is an array
+    """
+    return a * (a - 1) * 0.5
+# End of _choose2()
+
+
+def evaluate_entropy_metrics(joint_prob: np.ndarray, marginal_prob_b1: np.ndarray, marginal_prob_b2: np.ndarray,
+                             evaluation: Evaluation, is_sampled_graph: bool = False):
     """Evaluates the entropy (information theoretics based) goodness of partition metrics.
 
     Parameters
     ---------
-    joint_prob : np.ndarray
+    joint_prob : np.ndarray or scipy.sparse.csr_matrix (float)
         the normalized contingency table
+    marginal_prob_b1 : np.ndarray (float)
+        the marginal probabilities of the truth partition (the normalized row sums of the contingency table)
+    marginal_prob_b2 : np.ndarray (float)
+        the marginal probabilities of the algorithm partition (the normalized column sums of the contingency table)
     evaluation : Evaluation
         stores the evaluation metrics
     is_sampled_graph : bool = False
         True if evaluation is for a sampled_graph. Default = False
     """
     # compute the information theoretic metrics
-    marginal_prob_b2 = np.sum(joint_prob, 0)
-    marginal_prob_b1 = np.sum(joint_prob, 1)
-    idx_truth = np.nonzero(marginal_prob_b1)
-    idx_alg = np.nonzero(marginal_prob_b2)
-    evaluation = calc_entropy(marginal_prob_b1, marginal_prob_b2, idx_truth, idx_alg, evaluation, is_sampled_graph)
-    evaluation = calc_conditional_entropy(joint_prob, marginal_prob_b1, marginal_prob_b2, idx_truth, idx_alg,
-                                          evaluation, is_sampled_graph)
+    # the logs of the marginal probabilities are shared by all the metrics. The log of a zero marginal probability is
+    # never needed, since every joint probability in that row/column is also zero, so it is left as 0
+    log_marginal_prob_b1 = np.log(marginal_prob_b1, out=np.zeros_like(marginal_prob_b1), where=marginal_prob_b1 > 0)
+    log_marginal_prob_b2 = np.log(marginal_prob_b2, out=np.zeros_like(marginal_prob_b2), where=marginal_prob_b2 > 0)
+    evaluation = calc_entropy(marginal_prob_b1, marginal_prob_b2, log_marginal_prob_b1, log_marginal_prob_b2,
+                              evaluation, is_sampled_graph)
+    evaluation = calc_conditional_entropy(joint_prob, log_marginal_prob_b1, log_marginal_prob_b2, evaluation,
+                                          is_sampled_graph)
 
     if is_sampled_graph:
         if evaluation.sampled_graph_entropy_truth > 0:
@@ -412,13 +570,14 @@ def evaluate_entropy_metrics(joint_prob: np.ndarray, evaluation: Evaluation, is_
         evaluation.missed_info = fraction_missed_info
         evaluation.erroneous_info = fraction_err_info
 
-    print('Fraction of missed information: {}'.format(abs(fraction_missed_info)))
-    print('Fraction of erroneous information: {}'.format(abs(fraction_err_info)))
+    if evaluation.verbose:
+        print('Fraction of missed information: {}'.format(abs(fraction_missed_info)))
+        print('Fraction of erroneous information: {}'.format(abs(fraction_err_info)))
 # End of evaluate_entropy_metrics()
 
 
-def calc_entropy(p_marginal_truth: np.ndarray, p_marginal_alg: np.ndarray, idx_truth: np.ndarray,
-                 idx_alg: np.ndarray, evaluation: Evaluation, is_sampled_graph: bool = False) -> Evaluation:
+def calc_entropy(p_marginal_truth: np.ndarray, p_marginal_alg: np.ndarray, log_p_marginal_truth: np.ndarray,
+                 log_p_marginal_alg: np.ndarray, evaluation: Evaluation, is_sampled_graph: bool = False) -> Evaluation:
     """Calculates the entropy of the truth and algorithm partitions.
 
     Parameters
@@ -427,10 +586,12 @@ def calc_entropy(p_marginal_truth: np.ndarray, p_marginal_alg: np.ndarray, idx_t
         the marginal probabilities of the truth partition
     p_marginal_alg : np.ndarray (float)
         the marginal probabilities of the algorithm partition
-    idx_truth : np.ndarray (int)
-        the indexes of the non-zero marginal probabilities of the truth partition
-    idx_alg : np.ndarray (int)
-        the indexes of the non-zero marginal probabilities of the algorithm partition
+    log_p_marginal_truth : np.ndarray (float)
+        the logs of the marginal probabilities of the truth partition, 0 where the marginal probability is 0
+    log_p_marginal_alg : np.ndarray (float)
+        the logs of the marginal probabilities of the algorithm partition, 0 where the marginal probability is 0
+    evaluation : Evaluation
+        stores the evaluation metrics
     is_sampled_graph : bool
         True if evaluation is for a sampled graph. Default = False
 
@@ -440,10 +601,11 @@ def calc_entropy(p_marginal_truth: np.ndarray, p_marginal_alg: np.ndarray, idx_t
         the evaluation object, updated with the entropy metrics
     """
     # compute entropy of the non-partition2 and the partition2 version
-    entropy_truth = -np.sum(p_marginal_truth[idx_truth] * np.log(p_marginal_truth[idx_truth]))
-    print('Entropy of truth partition: {}'.format(abs(entropy_truth)))
-    entropy_alg = -np.sum(p_marginal_alg[idx_alg] * np.log(p_marginal_alg[idx_alg]))
-    print('Entropy of alg. partition: {}'.format(abs(entropy_alg)))
+    entropy_truth = -np.dot(p_marginal_truth, log_p_marginal_truth)
+    entropy_alg = -np.dot(p_marginal_alg, log_p_marginal_alg)
+    if evaluation.verbose:
+        print('Entropy of truth partition: {}'.format(abs(entropy_truth)))
+        print('Entropy of alg. partition: {}'.format(abs(entropy_alg)))
     if is_sampled_graph:
         evaluation.sampled_graph_entropy_truth = entropy_truth
         evaluation.sampled_graph_entropy_algorithm = entropy_alg
@@ -454,8 +616,8 @@ def calc_entropy(p_marginal_truth: np.ndarray, p_marginal_alg: np.ndarray, idx_t
 # End of calc_entropy()
 
 
-def calc_conditional_entropy(joint_prob: np.ndarray, p_marginal_truth: np.ndarray, p_marginal_alg: np.ndarray,
-                             idx_truth: np.ndarray, idx_alg: np.ndarray, evaluation: Evaluation,
+def calc_conditional_entropy(joint_prob: np.ndarray, log_p_marginal_truth: np.ndarray,
+                             log_p_marginal_alg: np.ndarray, evaluation: Evaluation,
                              is_sampled_graph: bool = False) -> Evaluation:
     """Calculates the conditional entropy metrics between the algorithmic and truth partitions. The following metrics
     are calculated:
@@ -466,26 +628,41 @@ def calc_conditional_entropy(joint_prob: np.ndarray, p_marginal_truth: np.ndarra
 
     Parameters
     ---------
+    joint_prob : np.ndarray or scipy.sparse.csr_matrix (float)
+            the normalized contingency table
+    log_p_marginal_truth : np.ndarray (float)
+            the logs of the marginal probabilities of the truth partition
+    log_p_marginal_alg : np.ndarray (float)
+            the logs of the marginal probabilities of the algorithm partition
+    evaluation : Evaluation
+            stores the evaluation metrics
+    is_sampled_graph : bool
+            True if evaluation is for a sampled graph. Default = False
 
     Returns
     ------
     evaluation : Evaluation
             the evaluation object, updated with the entropy-based goodness of partition metrics
-    is_sampled_graph : bool
-            True if evaluation is for a sampled graph. Default = False
     """
-    conditional_prob_b2_b1 = np.zeros(joint_prob.shape)
-    conditional_prob_b1_b2 = np.zeros(joint_prob.shape)
-    conditional_prob_b2_b1[idx_truth, :] = joint_prob[idx_truth, :] / p_marginal_truth[idx_truth, None]
-    conditional_prob_b1_b2[:, idx_alg] = joint_prob[:, idx_alg] / p_marginal_alg[None, idx_alg]
-
-    # compute the conditional entropies
-    idx = np.nonzero(joint_prob)
-    H_b2_b1 = -np.sum(np.sum(joint_prob[idx] * np.log(conditional_prob_b2_b1[idx])))
-    H_b1_b2 = -np.sum(np.sum(joint_prob[idx] * np.log(conditional_prob_b1_b2[idx])))
-    # compute the mutual information (symmetric)
-    marginal_prod = np.dot(p_marginal_truth[:, None], np.transpose(p_marginal_alg[:, None]))
-    MI_b1_b2 = np.sum(np.sum(joint_prob[idx] * np.log(joint_prob[idx] / marginal_prod[idx])))
+    # only the non-zero entries of the joint probability contribute to the sums. The conditional probabilities are
+    # never materialized, since log(p / q) = log(p) - log(q)
+    if issparse(joint_prob):
+        joint_prob = joint_prob.tocoo()
+        rows, cols, p = joint_prob.row, joint_prob.col, joint_prob.data
+    else:
+        rows, cols = np.nonzero(joint_prob)
+        p = joint_prob[rows, cols]
+    if NUMBA_AVAILABLE:
+        H_b1_b2, H_b2_b1, MI_b1_b2 = _conditional_entropy(rows, cols, p, log_p_marginal_truth, log_p_marginal_alg)
+    else:
+        log_p = np.log(p)
+        log_p_truth = log_p_marginal_truth[rows]
+        log_p_alg = log_p_marginal_alg[cols]
+        # compute the conditional entropies
+        H_b2_b1 = -np.sum(p * (log_p - log_p_truth))
+        H_b1_b2 = -np.sum(p * (log_p - log_p_alg))
+        # compute the mutual information (symmetric)
+        MI_b1_b2 = np.sum(p * (log_p - log_p_truth - log_p_alg))
 
     if is_sampled_graph:
         evaluation.sampled_graph_entropy_truth_given_algorithm = H_b1_b2
@@ -496,9 +673,52 @@ def calc_conditional_entropy(joint_prob: np.ndarray, p_marginal_truth: np.ndarra
         evaluation.entropy_algorithm_given_truth = H_b2_b1
         evaluation.mutual_info = MI_b1_b2
 
-    print('Conditional entropy of truth partition given alg. partition: {}'.format(abs(H_b1_b2)))
-    print('Conditional entropy of alg. partition given truth partition: {}'.format(abs(H_b2_b1)))
-    print('Mutual informationion between truth partition and alg. partition: {}'.format(abs(MI_b1_b2)))
+    if evaluation.verbose:
+        print('Conditional entropy of truth partition given alg. partition: {}'.format(abs(H_b1_b2)))
+        print('Conditional entropy of alg. partition given truth partition: {}'.format(abs(H_b2_b1)))
+        print('Mutual informationion between truth partition and alg. partition: {}'.format(abs(MI_b1_b2)))
 
     return evaluation
 # End of calc_conditional_entropy()
+
+
+@njit(fastmath=True, cache=True)
+def _conditional_entropy(rows: np.ndarray, cols: np.ndarray, p: np.ndarray, log_p_marginal_truth: np.ndarray,
+                         log_p_marginal_alg: np.ndarray) -> Tuple[float, float, float]:
+    """Computes the conditional entropies and mutual information in a single pass over the non-zero joint
+    probabilities, without allocating any temporary arrays.
+
+    Parameters
+    ---------
+    rows : np.ndarray (int)
+        the truth block of each non-zero joint probability
+    cols : np.ndarray (int)
+        the algorithm block of each non-zero joint probability
+    p : np.ndarray (float)
+        the non-zero joint probabilities
+    log_p_marginal_truth : np.ndarray (float)
+        the logs of the marginal probabilities of the truth partition
+    log_p_marginal_alg : np.ndarray (float)
+        the logs of the marginal probabilities of the algorithm partition
+
+    Returns
+    ------
+    H_b1_b2 : float
+        the entropy of the truth partition given the algorithm partition
+    H_b2_b1 : float
+        the entropy of the algorithm partition given the truth partition
+    MI_b1_b2 : float
+        the mutual information between the truth and algorithm partitions
+    """
+    H_b1_b2 = 0.0
+    H_b2_b1 = 0.0
+    MI_b1_b2 = 0.0
+    for i in range(p.shape[0]):
+        log_p = math.log(p[i])
+        log_p_truth = log_p_marginal_truth[rows[i]]
+        log_p_alg = log_p_marginal_alg[cols[i]]
+        H_b1_b2 -= p[i] * (log_p - log_p_alg)
+        H_b2_b1 -= p[i] * (log_p - log_p_truth)
+        MI_b1_b2 += p[i] * (log_p - log_p_truth - log_p_alg)
+    return H_b1_b2, H_b2_b1, MI_b1_b2
+# End of _conditional_entropy()
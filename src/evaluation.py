@@ -12,6 +12,7 @@ from graph_tool.clustering import global_clustering
 from graph_tool.inference import BlockState
 from graph_tool.topology import pseudo_diameter, extract_largest_component
 import numpy as np
+from scipy.sparse import issparse
 
 from util import partition_from_truth
 
@@ -120,6 +121,7 @@ class Evaluation(object):
         """
         # CSV file into which to write the results
         self.args = args
+        self.verbose = args.verbose
         self.csv_file = args.csv + ".csv"
         self.csv_details_file = args.csv + "_details.csv"
         # Dataset parameters
@@ -497,9 +499,10 @@ class Evaluation(object):
                                  self.args.tag])
             if self.contingency_table is not None:
                 for row in range(np.shape(self.contingency_table)[0]):
+                    row_values = _dense_row(self.contingency_table, row)
                     for col in range(np.shape(self.contingency_table)[1]):
                         writer.writerow([self.args.numNodes, self.args.overlap, self.args.blockSizeVar, row, False,
-                                        col, self.contingency_table[row, col], False, self.sample_size,
+                                        col, row_values[col], False, self.sample_size,
                                         self.sampling_algorithm, self.sampling_iterations, self.args.tag])
             if (self.sampling_algorithm == "none") or (self.args.sample_size == 0):
                 return
@@ -513,9 +516,31 @@ class Evaluation(object):
                                  self.args.tag])
             if self.sampled_graph_contingency_table is not None:
                 for row in range(np.shape(self.sampled_graph_contingency_table)[0]):
+                    row_values = _dense_row(self.sampled_graph_contingency_table, row)
                     for col in range(np.shape(self.sampled_graph_contingency_table)[1]):
                         writer.writerow([self.args.numNodes, self.args.overlap, self.args.blockSizeVar, row, False,
-                                        col, self.sampled_graph_contingency_table[row, col], False, self.sample_size,
+                                        col, row_values[col], False, self.sample_size,
                                         self.sampling_algorithm, self.sampling_iterations, self.args.tag])
     # End of _save_details()
 # End of Evaluation()
+
+
+def _dense_row(table: np.ndarray, row: int) -> np.ndarray:
+    """Returns a row of the contingency table as a dense array, whether or not the table itself is sparse.
+
+    Parameters
+    ----------
+    table : np.ndarray or scipy.sparse.csr_matrix
+        the contingency table
+    row : int
+        the index of the row
+
+    Returns
+    -------
+    row_values : np.ndarray
+        the values in that row of the contingency table
+    """
+    if issparse(table):
+        return table[row].toarray().ravel()
+    return table[row]
+# End of _dense_row()
@@ -71,6 +71,10 @@ def parse_arguments():
     parser.add_argument("--gtload", action="store_true",
                         help="""If true, will load the graph using graph tool's load graph function""")
     parser.add_argument("--undirected", action="store_true", help="If true, graph is symmetrical")
+    parser.add_argument("--skip_accuracy", action="store_true",
+                        help="""If true, will not compute the accuracy, which requires matching the truth and algorithm
+                             blocks using linear assignment. This can take a long time when there are thousands of
+                             blocks""")
     args = parser.parse_args()
     return args
 # End of parse_arguments()